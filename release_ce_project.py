@@ -6,18 +6,31 @@ It also creates .pak files from the asset directory and writes an appropriate sy
 import os
 import sys
 import json
+import time
 import shutil
 import fnmatch
+import hashlib
+import zipfile
+import argparse
 import platform
+import tempfile
+import threading
 import subprocess
 import collections
+import http.server
+import socketserver
+import urllib.request
+import concurrent.futures
 
-# Name of the Game/Plugin DLL file.
+# Default name of the Game/Plugin DLL file, used when the project does not ship one.
 dll_name = 'Game.dll'
 
 # Path to the project file. (Appended to end of command line specified projects)
 cryproject_file = ''
 
+# Port the deploy service listens on by default (see --daemon).
+daemon_port = 8642
+
 class EngineMetadata(object):
     """
         Simple container for required metadata for each project
@@ -34,104 +47,435 @@ class EngineMetadata(object):
         self.path = path
         self.id = id
 
+class DeployOptions(object):
+    """
+        Settings for a single project deployment.
+        Anything left as None falls back to the behaviour of the command line script.
+    """
+
+    def __init__(self, export_path=None, engine_path=None, engine_version=None,
+                 platform_dir=os.path.join('bin', 'win_x64'), jobs=1, cache=None):
+        # Directory the project is exported to (defaults to a folder named after the project on the desktop).
+        self.export_path = export_path
+        # Engine root to use instead of the registered engine, and its version (e.g. "5.3").
+        self.engine_path = engine_path
+        self.engine_version = engine_version
+        # Binary directory, relative to both the engine and the project roots.
+        self.platform_dir = platform_dir
+        # Number of asset folders to package at the same time.
+        self.jobs = jobs
+        # DeployCache shared with other deployments, if any.
+        self.cache = cache
+
+class DeployResult(object):
+    """
+        Outcome of a single project deployment
+    """
+
+    def __init__(self, project_file):
+        self.project_file = project_file
+        self.project_name = ""
+        self.engine = None
+        self.export_path = ""
+        self.dll_name = dll_name
+        # Every file written to the export directory.
+        self.outputs = []
+        # Totals plus the time (in seconds) taken by each step.
+        self.stats = collections.OrderedDict()
+        self.stats['steps'] = collections.OrderedDict()
+
+class DuplicateReport(object):
+    """
+        Byte-identical files and copies of engine files found by analyse_duplicates
+    """
+
+    def __init__(self):
+        # (file size, paths) for every set of identical project files, largest waste first.
+        self.groups = []
+        # Project file -> engine pak holding the same content at the same path relative to the engine root.
+        # The game does not load these from the engine pak, so they are only reported.
+        self.engine_copies = collections.OrderedDict()
+        self.sizes = {}
+
+    @property
+    def wasted_bytes(self):
+        return sum(size * (len(paths) - 1) for size, paths in self.groups)
+
+    @property
+    def engine_copy_bytes(self):
+        return sum(self.sizes[path] for path in self.engine_copies)
+
+class DeployCache(object):
+    """
+        Data kept between deployments by a long-running process (see DeployService).
+        Engine metadata, engine directory listings and built .pak files are reused
+        for as long as their source is unchanged. Safe to share between threads.
+    """
+
+    def __init__(self, pak_dir=None):
+        self.lock = threading.Lock()
+        self.engines = {}
+        # Directory path -> (modification time of every directory scanned, relative file paths)
+        self.scans = {}
+        # Asset folder -> (fingerprint, path of the cached pak)
+        self.paks = {}
+        # A copy of every pak built is kept here, so later exports can reuse it.
+        # A temporary directory is created (and removed again by close()) unless one is given.
+        self.owns_pak_dir = not pak_dir
+        self.pak_dir = pak_dir or tempfile.mkdtemp(prefix='ce_paks_')
+        self.stats = collections.Counter()
+
+    def get_engine_metadata(self, engine_tag):
+        with self.lock:
+            meta = self.engines.get(engine_tag)
+        if meta:
+            self.count('engine_hits')
+            return meta
+
+        meta = get_engine_metadata(engine_tag)
+        with self.lock:
+            self.engines[engine_tag] = meta
+        self.count('engine_misses')
+        return meta
+
+    def list_files(self, path):
+        """
+        Relative paths of every file below *path*.
+        The listing is reused while no directory below *path* has been modified,
+        which catches files being added, removed or renamed anywhere in the tree.
+        """
+        with self.lock:
+            scan = self.scans.get(path)
+        if scan and get_dir_mtimes(scan[0]) == scan[0]:
+            self.count('scan_hits')
+            return scan[1]
+
+        dir_mtimes, files = scan_tree(path)
+        with self.lock:
+            self.scans[path] = (dir_mtimes, files)
+        self.count('scan_misses')
+        return files
+
+    def fetch_pak(self, inpath, pakpath, build):
+        """
+        Write the pak of the folder *inpath* to *pakpath*, reusing an earlier build when none of its files changed.
+        Otherwise *build* is called with *pakpath* and the result is kept for next time.
+        """
+        inpath = os.path.abspath(inpath)
+        fingerprint = fingerprint_folder(inpath)
+        with self.lock:
+            cached = self.paks.get(inpath)
+        if cached and cached[0] == fingerprint:
+            try:
+                shutil.copyfile(cached[1], pakpath)
+                self.count('pak_hits')
+                return
+            except FileNotFoundError:
+                # Another job replaced the cached pak in the meantime.
+                pass
+
+        build(pakpath)
+
+        # Another job may already have stored the same pak, and may be copying it right now,
+        # which makes replacing it fail on Windows; keeping either copy is fine.
+        cached_path = os.path.join(self.pak_dir, fingerprint + '.pak')
+        if not os.path.exists(cached_path):
+            temp_path = '{}.{}.tmp'.format(cached_path, threading.get_ident())
+            shutil.copyfile(pakpath, temp_path)
+            try:
+                os.replace(temp_path, cached_path)
+            except OSError:
+                os.remove(temp_path)
+        with self.lock:
+            previous = self.paks.get(inpath)
+            self.paks[inpath] = (fingerprint, cached_path)
+            if previous and previous[1] != cached_path:
+                try:
+                    os.remove(previous[1])
+                except OSError:
+                    # Missing, or (on Windows) still being copied by another job; close() cleans it up.
+                    pass
+        self.count('pak_misses')
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def close(self):
+        """
+        Remove the cached paks, if they are kept in a temporary directory.
+        """
+        if self.owns_pak_dir:
+            shutil.rmtree(self.pak_dir, ignore_errors=True)
+
+class DeployJob(object):
+    """
+        A project deployment queued on a DeployService
+    """
+
+    def __init__(self, id, project_file, options):
+        self.id = id
+        self.project_file = project_file
+        self.options = options
+        # One of 'queued', 'running', 'done' or 'failed'.
+        self.status = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        data = collections.OrderedDict()
+        data['id'] = self.id
+        data['project'] = self.project_file
+        data['status'] = self.status
+        data['submitted'] = self.submitted
+        data['started'] = self.started
+        data['finished'] = self.finished
+        data['queue_seconds'] = (self.started or time.time()) - self.submitted
+        data['run_seconds'] = ((self.finished or time.time()) - self.started) if self.started else None
+        data['error'] = self.error
+        if self.result:
+            data['export_path'] = self.result.export_path
+            data['dll_name'] = self.result.dll_name
+            data['stats'] = self.result.stats
+        return data
+
 def main():
     """
         Main entry handles the command line entries
     """
-    global cryproject_file
-    
+    project_file = cryproject_file
     cryproject_list = []
+
+    parser = argparse.ArgumentParser(description='Export CRYENGINE projects into a standalone directory.')
+    parser.add_argument('projects', nargs='*', help='.cryproject (or legacy project.cfg) files to export.')
+    parser.add_argument('--daemon', default=False, action='store_true',
+                        help='Run a local deploy service that accepts projects over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address the deploy service listens on.')
+    parser.add_argument('--port', default=daemon_port, type=int, help='Port the deploy service listens on.')
+    parser.add_argument('--concurrency', default=2, type=int, help='Number of projects the service deploys at once.')
+    parser.add_argument('--server', help='URL of a running deploy service to send the projects to.')
+    parser.add_argument('--jobs', default=4, type=int,
+                        help='Number of asset folders packed (or files hashed) at the same time.')
+    parser.add_argument('--find-duplicates', default=False, action='store_true',
+                        help='Only report duplicated asset files and copies of engine files, without exporting.')
+    args = parser.parse_args(get_launch_args())
+
+    # The service only runs deploys, which would delete and rewrite the export directory.
+    if args.server and args.find_duplicates:
+        parser.error('--find-duplicates cannot be used with --server.')
+
+    # Sending jobs to a service does not need the engine on this machine.
+    if args.server:
+        client = DeployClient(args.server)
+        for project_file in args.projects:
+            job = client.wait(client.submit(project_file, jobs=args.jobs)['id'])
+            print('Job {} ({}): {}'.format(job['id'], job['project'], job['error'] or job['status']))
+        return
     
     # Check platform support
     if not is_platform_valid():
         print ("[WARNING] Platform ", platform.system()," is not supported.")
         return
+
+    if args.daemon:
+        run_daemon(args.host, args.port, args.concurrency)
+        return
     
     # Check for project path arguments
-    cryproject_list = get_launch_args()
+    cryproject_list = args.projects
     if len(cryproject_list) > 0:
-        if not cryproject_file:
-            cryproject_file = cryproject_list[0]
-        elif cryproject_file not in cryproject_list:
-            cryproject_list.append(cryproject_file)
+        if not project_file:
+            project_file = cryproject_list[0]
+        elif project_file not in cryproject_list:
+            cryproject_list.append(project_file)
+    elif project_file:
+        cryproject_list.append(project_file)
             
     # Check we have a project file
-    if not cryproject_file:
+    if not project_file:
         print ("Please specify a .cryproject file or drag one onto this script, for legacy 5.0-5.1 you can drop your project.cfg instead.")
         return
     
+    options = DeployOptions(jobs=args.jobs)
+
     # Multi-Project deployment option
     for project_file in cryproject_list:
         # Check existence of project file
-        if os.path.exists(project_file):
-            do_project_deploy(project_file)
-        else:
+        if not os.path.exists(project_file):
             print ("Specified project file could not be found. ", project_file)
+        elif args.find_duplicates:
+            do_find_duplicates(project_file, options)
+        else:
+            do_project_deploy(project_file, options)
         
     return
     
-def do_project_deploy(cryproject_filepath):
+def do_project_deploy(cryproject_filepath, options=None):
     """
     Main packaging routine.
     Detached from main to allow multi-project processing with multiple command-line arguments.
     """
-    
-    with open(cryproject_filepath) as fd:
-        if cryproject_filepath.endswith("project.cfg"): # Legacy support
-            project_cfg = make_project_from_legacy(fd)
-        elif cryproject_filepath.endswith(".cryproject"):
-            project_cfg = json.load(fd)
-    
-    if not "info" in project_cfg:
-        print("Error reading project data.")
+    try:
+        result = deploy_project(cryproject_filepath, options)
+    except ValueError as e:
+        print(e)
         return
+
+    print('Exported {} files ({} bytes) to "{}" in {:.1f}s.'.format(result.stats['files'],
+                                                                   result.stats['bytes'],
+                                                                   result.export_path,
+                                                                   result.stats['seconds']))
+    return result
+
+def do_find_duplicates(cryproject_filepath, options=None):
+    """
+    Print the duplicate report of a project, reporting errors the way do_project_deploy does.
+    """
+    try:
+        report = find_project_duplicates(cryproject_filepath, options)
+    except (ValueError, OSError) as e:
+        print(e)
+        return
+
+    print_duplicate_report(report)
+    return report
+
+def deploy_project(cryproject_filepath, options=None):
+    """
+    Export a single project and return a DeployResult describing it.
+    Neither the working directory nor any module state is changed, so several
+    projects can be deployed at once from different threads.
+    :param cryproject_filepath: Path to the .cryproject (or legacy project.cfg) file.
+    :param options: DeployOptions, or None to use the defaults.
+    """
+    if options is None:
+        options = DeployOptions()
+
+    start = time.time()
+    result = DeployResult(cryproject_filepath)
+
+    cryproject_filepath = os.path.abspath(cryproject_filepath)
+    project_cfg = load_project_file(cryproject_filepath)
     project_path = os.path.dirname(cryproject_filepath)
-    
-    # Engine tag is the id of the registered engine this project uses
-    engine_tag = project_cfg['require']['engine']
-    
+    result.project_name = project_cfg['info']['name']
+
     # Engine Meta contains the name, id, version and path to the engine root.
-    engine_meta = get_engine_metadata(engine_tag)
-    if not engine_meta:
-        print ("Could not find a compatible engine registered.")
-        return
-        
+    engine_meta = resolve_engine(project_cfg['require']['engine'], options)
+    result.engine = engine_meta
+
     engine_path = engine_meta.path
     version = engine_meta.version
+    platform_dir = options.platform_dir
     
     print('Using engine path "{}".'.format(engine_path))
     
     # Path to which the game is to be exported.
-    export_path = os.path.join(os.environ['HOMEDRIVE'],
-                            os.environ['HOMEPATH'],
-                            'Desktop',
-                            project_cfg['info']['name'])
+    export_path = options.export_path or get_default_export_path(result.project_name)
+    export_path = os.path.abspath(export_path)
+    result.export_path = export_path
                             
     # Ensure that only the current data are exported, making sure that errors are reported.
     if os.path.exists(export_path):
         shutil.rmtree(export_path)
 
     # Copy engine (common) files.
-    copy_engine_assets(engine_path, export_path)
-    copy_engine_binaries(engine_path, export_path, os.path.join('bin', 'win_x64'))
+    timed_step(result, 'engine_assets', copy_engine_assets, engine_path, export_path)
+    timed_step(result, 'engine_binaries', copy_engine_binaries, engine_path, export_path, platform_dir,
+               options.cache)
 
     if 'csharp' in project_cfg:
-        copy_mono_files(engine_path, export_path)
+        timed_step(result, 'mono', copy_mono_files, engine_path, export_path, platform_dir)
 
     # Copy project-specific files.
-    copy_game_dll(project_path, export_path)
+    game_dll = timed_step(result, 'game_dll', copy_game_dll, project_path, export_path, platform_dir)
+    if game_dll:
+        result.dll_name = game_dll
 
     asset_dir = project_cfg['content']['assets'][0]
-    package_assets(asset_dir, project_path, export_path)
-    copy_levels(asset_dir, project_path, export_path)
-    create_config(asset_dir, export_path)
+    timed_step(result, 'assets', package_assets, asset_dir, project_path, export_path, options.jobs,
+               options.cache)
+    timed_step(result, 'levels', copy_levels, asset_dir, project_path, export_path)
+    create_config(asset_dir, export_path, result.dll_name)
     
     # Copy any version-specific data
-    copy_version_specific_content(version, project_path, export_path)
+    copy_version_specific_content(version, project_path, export_path, result.dll_name, platform_dir)
+
+    collect_outputs(result)
+    result.stats['seconds'] = time.time() - start
+    return result
+
+def load_project_file(cryproject_filepath):
+    """
+    Read a .cryproject file, or build the equivalent data for a legacy project.cfg.
+    Raises ValueError if the file does not contain usable project data.
+    """
+    project_cfg = {}
+    with open(cryproject_filepath) as fd:
+        if cryproject_filepath.endswith("project.cfg"): # Legacy support
+            project_cfg = make_project_from_legacy(fd)
+        elif cryproject_filepath.endswith(".cryproject"):
+            project_cfg = json.load(fd)
     
-    return
+    if not "info" in project_cfg:
+        raise ValueError("Error reading project data.")
+    return project_cfg
+
+def resolve_engine(engine_tag, options):
+    """
+    Find the engine for *engine_tag*, unless *options* overrides the engine path.
+    """
+    if not options.engine_path:
+        if options.cache:
+            return options.cache.get_engine_metadata(engine_tag)
+        return get_engine_metadata(engine_tag)
+
+    version = options.engine_version
+    if not version and is_default_tag(engine_tag):
+        version = engine_tag[-3:]
+    return EngineMetadata(os.path.basename(os.path.normpath(options.engine_path)),
+                          version or "", options.engine_path, engine_tag)
+
+def get_default_export_path(project_name):
+    """
+    Folder named after the project on the current user's desktop.
+    """
+    if 'HOMEDRIVE' in os.environ and 'HOMEPATH' in os.environ:
+        home = os.path.join(os.environ['HOMEDRIVE'], os.environ['HOMEPATH'])
+    else:
+        home = os.path.expanduser('~')
+    return os.path.join(home, 'Desktop', project_name)
+
+def timed_step(result, name, func, *args):
+    """
+    Run *func* with *args*, recording how long it took in the result stats.
+    """
+    start = time.time()
+    value = func(*args)
+    result.stats['steps'][name] = time.time() - start
+    return value
 
-def copy_version_specific_content(version, project_path, export_path):
+def collect_outputs(result):
+    """
+    List the exported files and fill in the totals of *result*.
+    """
+    outputs = []
+    total_bytes = 0
+    for root, _, filenames in os.walk(result.export_path):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            outputs.append(path)
+            total_bytes += os.path.getsize(path)
+
+    result.outputs = outputs
+    result.stats['files'] = len(outputs)
+    result.stats['paks'] = len([path for path in outputs if path.endswith('.pak')])
+    result.stats['bytes'] = total_bytes
+
+def copy_version_specific_content(version, project_path, export_path, game_dll=dll_name,
+                                   platform_dir=os.path.join('bin', 'win_x64')):
     """
     For specific copy procedures needed for specific engine iterations
     Example: cryplugin.csv is required for 5.2 and 5.3
@@ -161,20 +505,20 @@ def copy_version_specific_content(version, project_path, export_path):
     
     # Rename Game.dll to CryGameZero.dll
     if v50_rename_game_dll:
-        src = os.path.normpath(os.path.join(export_path, "bin", "win_x64", dll_name))
-        dest = os.path.normpath(os.path.join(export_path, "bin", "win_x64", "CryGameZero.dll"))
+        src = os.path.normpath(os.path.join(export_path, platform_dir, game_dll))
+        dest = os.path.normpath(os.path.join(export_path, platform_dir, "CryGameZero.dll"))
         if os.path.exists(src):
             os.rename(src, dest)
     return
     
-def copy_engine_binaries(engine_path, export_path, rel_dir):
+def copy_engine_binaries(engine_path, export_path, rel_dir, cache=None):
     """
     Copy a directory to its corresponding location in the export directory.
     :param engine_path: Current location of the files (project_path or engine_path).
     :param export_path: Path to which the binaries should be exported.
     :param rel_dir: Path of the directory to copy, relative to *source_dir*.
+    :param cache: Optional DeployCache used to avoid rescanning the engine directory.
     """
-    copypaths = []
 
     excludes = ['imageformats**',
                 'ToolkitPro*',
@@ -196,12 +540,9 @@ def copy_engine_binaries(engine_path, export_path, rel_dir):
                 'CrashSender*'
                 ]
 
-    pwd = os.getcwd()
-    os.chdir(engine_path)
-    for root, _, filenames in os.walk(rel_dir):
-        for filename in filenames:
-            copypaths.append(os.path.normpath(os.path.join(root, filename)))
-    os.chdir(pwd)
+    bindir = os.path.join(engine_path, rel_dir)
+    filenames = cache.list_files(bindir) if cache else scan_files(bindir)
+    copypaths = [os.path.normpath(os.path.join(rel_dir, filename)) for filename in filenames]
 
     for path in copypaths:
         excluded = False
@@ -214,7 +555,7 @@ def copy_engine_binaries(engine_path, export_path, rel_dir):
             os.makedirs(os.path.dirname(destpath))
         shutil.copy(os.path.join(engine_path, path), destpath)
 
-def copy_mono_files(engine_path, export_path):
+def copy_mono_files(engine_path, export_path, platform_dir=os.path.join('bin', 'win_x64')):
     """
     Copy mono directory and CRYENGINE C# libraries to export path.
     """
@@ -223,12 +564,12 @@ def copy_mono_files(engine_path, export_path):
 
     shutil.copytree(os.path.join(input_bindir, 'common'), os.path.join(output_bindir, 'common'))
 
-    for csharp_file in os.listdir(os.path.join(input_bindir, 'win_x64')):
+    for csharp_file in os.listdir(os.path.join(engine_path, platform_dir)):
         # We've already copied the non-C# libraries, so skip them here.
         if not fnmatch.fnmatch(csharp_file, 'CryEngine.*.dll'):
             continue
-        shutil.copyfile(os.path.join(input_bindir, 'win_x64', csharp_file),
-                        os.path.join(output_bindir, 'win_x64', csharp_file))
+        shutil.copyfile(os.path.join(engine_path, platform_dir, csharp_file),
+                        os.path.join(export_path, platform_dir, csharp_file))
 
 def copy_engine_assets(engine_path, export_path):
     """
@@ -253,27 +594,24 @@ def copy_levels(asset_dir, project_path, export_path):
     """
     Copy required level files to the export directory.
     """
-    pwd = os.getcwd()
-    os.chdir(os.path.join(project_path, asset_dir))
+    input_assetpath = os.path.join(project_path, asset_dir)
 
     # Other files are only required by the editor.
     level_files = ['filelist.xml', 'terraintexture.pak', 'level.pak']
 
-    for root, _, filenames in os.walk('levels'):
+    for root, _, filenames in os.walk(os.path.join(input_assetpath, 'levels')):
         for filename in filenames:
             if filename not in level_files:
                 continue
 
-            path = os.path.normpath(os.path.join(root, filename))
+            path = os.path.normpath(os.path.relpath(os.path.join(root, filename), input_assetpath))
             destpath = os.path.normpath(os.path.join(export_path, asset_dir, path))
             if not os.path.exists(os.path.dirname(destpath)):
                 os.makedirs(os.path.dirname(destpath))
             shutil.copy(os.path.join(project_path, asset_dir, path), destpath)
-
-    os.chdir(pwd)
     return
 
-def package_assets(asset_dir, project_path, export_path):
+def package_assets(asset_dir, project_path, export_path, jobs=1, cache=None):
     """
     Create .pak files from the loose assets, which are placed in the exported directory.
     """
@@ -284,102 +622,296 @@ def package_assets(asset_dir, project_path, export_path):
         os.makedirs(output_assetpath)
 
     # Use 7-zip if it exists, because it's generally faster.
-    use_7zip = os.path.exists(r"C:\Program Files\7-Zip")
-    if use_7zip:
-        os.environ['PATH'] = os.environ['PATH'] + os.pathsep + r"C:\Program Files\7-Zip"
+    zip_exe = get_7zip_path()
+
+    files, pack_items = list_asset_items(input_assetpath, output_assetpath)
+
+    for itemname in files:
+        shutil.copyfile(os.path.join(input_assetpath, itemname), os.path.join(output_assetpath, itemname))
+
+    # create export folders if necessary
+    for _, _, dest in pack_items:
+        if not os.path.exists(dest):
+            os.makedirs(dest)
+
+    if jobs > 1 and len(pack_items) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(package_or_copy, name, src, dest, zip_exe, cache)
+                       for name, src, dest in pack_items]
+            for future in futures:
+                future.result()
+    else:
+        for name, src, dest in pack_items:
+            package_or_copy(name, src, dest, zip_exe, cache)
+    return
 
-    for itemname in os.listdir(input_assetpath):
+def list_asset_items(input_assetpath, output_assetpath):
+    """
+    Decide what happens to each item of the asset directory.
+    Returns the names of the loose files to copy, and the items to pack as
+    (itemname, input path, output path).
+    """
+    files = []
+    pack_items = []
+
+    for itemname in sorted(os.listdir(input_assetpath)):
         itempath = os.path.join(input_assetpath, itemname)
 
         # Levels are handled elsewhere.
         if 'levels' in itemname.lower():
             continue
-            
-            
 
         # .cryasset.pak files are editor-only, and so do not belong in exported projects.
         if itempath.endswith('.cryasset.pak'):
             continue
 
         if os.path.isfile(itempath):
-            shutil.copyfile(itempath, os.path.join(output_assetpath, itemname))
+            files.append(itemname)
+        # Fastload and localization are special cases, each of their folders gets its own pak.
+        elif '_fastload' in itemname.lower() or 'localization' in itemname.lower():
+            for sub_itemname in sorted(os.listdir(itempath)):
+                pack_items.append((sub_itemname, itempath, os.path.join(output_assetpath, itemname)))
         else:
-            # Fastload is another special case
-            if '_fastload' in itemname.lower():
-                export_langpath = os.path.join(output_assetpath, "_fastload")
-                
-                # create export folder if necessary
-                if not os.path.exists(export_langpath):
-                    os.makedirs(export_langpath)
-                    
-                for sub_itemname in os.listdir(itempath):
-                    sub_itempath = os.path.join(itempath,sub_itemname)
-                    
-                    package_or_copy(sub_itemname, itempath, os.path.join(output_assetpath, itemname), use_7zip)
-                
-            
-            # Localization is a special case
-            elif 'localization' in itemname.lower():
-                export_langpath = os.path.join(output_assetpath, "localization")
-                
-                # create export folder if necessary
-                if not os.path.exists(export_langpath):
-                    os.makedirs(export_langpath)
-                
-                for sub_itemname in os.listdir(itempath):
-                    sub_itempath = os.path.join(itempath,sub_itemname)
-                    
-                    package_or_copy(sub_itemname, itempath, os.path.join(output_assetpath, itemname), use_7zip)
-            else:
-                package_or_copy(itemname, input_assetpath, output_assetpath, use_7zip)
-    return
+            pack_items.append((itemname, input_assetpath, output_assetpath))
+
+    return files, pack_items
 
 # Decides whether to package or just copy the supplied path based on whether the path is a file or a folder
-def package_or_copy(itemname, in_assetpath, out_assetpath, use7zip):
+def package_or_copy(itemname, in_assetpath, out_assetpath, zip_exe=None, cache=None):
     inpath = os.path.join(in_assetpath, itemname)
     outpath = os.path.join(out_assetpath, itemname)
     
     if os.path.isfile(inpath):
         shutil.copyfile(inpath, outpath)
     else:
-        if use7zip:
-            zip_cmd = ['7z',
-                       'a',
-                       '-r',
-                       '-tzip',
-                       '-mx0',
-                       outpath,
-                       inpath]
-            subprocess.check_call(zip_cmd)
+        def build(pakpath):
+            if zip_exe:
+                zip_cmd = [zip_exe,
+                           'a',
+                           '-r',
+                           '-tzip',
+                           '-mx0',
+                           pakpath,
+                           inpath]
+                subprocess.check_call(zip_cmd)
+            else:
+                make_pak(in_assetpath, itemname, pakpath)
+
+        if cache:
+            cache.fetch_pak(inpath, outpath + '.pak', build)
         else:
-            pakname = shutil.make_archive(base_name=outpath,
-                                          format='zip',
-                                          root_dir=in_assetpath,
-                                          base_dir=itemname)
-            shutil.move(pakname, pakname.replace('.zip', '.pak'))
+            build(outpath + '.pak')
         print('Created {}.pak'.format(itemname))
+
+def make_pak(in_assetpath, itemname, pakpath):
+    """
+    Zip the folder *itemname* (relative to *in_assetpath*) into *pakpath*.
+    Used instead of shutil.make_archive, which changes the working directory while it runs.
+    """
+    with zipfile.ZipFile(pakpath, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for root, _, filenames in os.walk(os.path.join(in_assetpath, itemname)):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                zf.write(path, os.path.relpath(path, in_assetpath))
+
+def scan_files(path):
+    """
+    Relative paths of every file below *path*.
+    """
+    return scan_tree(path)[1]
+
+def scan_tree(path):
+    """
+    Like scan_files, but also returns the modification time of every directory walked, keyed by path.
+    """
+    dir_mtimes = {}
+    files = []
+    for root, _, filenames in os.walk(path):
+        dir_mtimes[root] = os.stat(root).st_mtime_ns
+        for filename in filenames:
+            files.append(os.path.relpath(os.path.join(root, filename), path))
+    return dir_mtimes, files
+
+def get_dir_mtimes(dirs):
+    """
+    Current modification times of *dirs*, None for any that no longer exist.
+    """
+    dir_mtimes = {}
+    for path in dirs:
+        try:
+            dir_mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            dir_mtimes[path] = None
+    return dir_mtimes
+
+def fingerprint_folder(path):
+    """
+    Hash of the location, names, sizes and modification times of every file below *path*.
+    """
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8'))
+    for relpath in sorted(scan_files(path)):
+        st = os.stat(os.path.join(path, relpath))
+        digest.update('{}|{}|{}\n'.format(relpath, st.st_size, st.st_mtime_ns).encode('utf-8'))
+    return digest.hexdigest()
+
+def find_project_duplicates(cryproject_filepath, options=None):
+    """
+    Run analyse_duplicates on the assets of a project file.
+    """
+    if options is None:
+        options = DeployOptions()
+
+    cryproject_filepath = os.path.abspath(cryproject_filepath)
+    project_cfg = load_project_file(cryproject_filepath)
+    engine_meta = resolve_engine(project_cfg['require']['engine'], options)
+    return analyse_duplicates(project_cfg['content']['assets'][0], os.path.dirname(cryproject_filepath),
+                              engine_meta.path, options.jobs)
+
+def analyse_duplicates(asset_dir, project_path, engine_path, jobs=4):
+    """
+    Find the byte-identical files among the assets that package_assets packs, and the project files
+    that match an engine pak entry in path (relative to the game and engine roots) and content.
+    Only files sharing a size with another file or engine entry are hashed, *jobs* at a time.
+    This is a report only: game paths are not looked up in the engine paks, so nothing is left out.
+    """
+    report = DuplicateReport()
+    _, pack_items = list_asset_items(os.path.join(project_path, asset_dir), '')
+
+    # (file, path from the game folder) for every file packed.
+    pak_files = []
+    for itemname, in_assetpath, out_assetpath in pack_items:
+        inpath = os.path.join(in_assetpath, itemname)
+        if os.path.isfile(inpath):
+            continue
+        for relpath in scan_files(inpath):
+            path = os.path.normpath(os.path.join(inpath, relpath))
+            # Localization and fastload paks are mounted in their own folder below the game folder.
+            pak_files.append((path, pak_entry_name(os.path.normpath(os.path.join(out_assetpath, itemname, relpath)))))
+            report.sizes[path] = os.path.getsize(path)
+
+    engine_entries = index_engine_paks(engine_path)
+    size_counts = collections.Counter(report.sizes.values())
+
+    # Project file -> (engine pak, ZipInfo) for entries matching in path and size.
+    engine_matches = {}
+    for path, game_path in pak_files:
+        entry = engine_entries.get(game_path)
+        if entry and entry[1].file_size == report.sizes[path]:
+            engine_matches[path] = entry
+
+    to_hash = [path for path, _ in pak_files if size_counts[report.sizes[path]] > 1 or path in engine_matches]
+    engine_to_hash = collections.defaultdict(dict)
+    for enginepak, info in engine_matches.values():
+        engine_to_hash[enginepak][info.filename] = info
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        file_futures = [(path, executor.submit(hash_file, path)) for path in to_hash]
+        pak_futures = [(enginepak, executor.submit(hash_pak_entries, enginepak, list(infos.values())))
+                       for enginepak, infos in engine_to_hash.items()]
+        digests = dict((path, future.result()) for path, future in file_futures)
+        engine_digests = dict((enginepak, future.result()) for enginepak, future in pak_futures)
+
+    groups = collections.defaultdict(list)
+    for path in to_hash:
+        size = report.sizes[path]
+        if size and size_counts[size] > 1:
+            groups[(size, digests[path])].append(path)
+    report.groups = sorted(((size, paths) for (size, _), paths in groups.items() if len(paths) > 1),
+                           key=lambda group: group[0] * (len(group[1]) - 1), reverse=True)
+
+    for path, _ in pak_files:
+        if path not in engine_matches:
+            continue
+        enginepak, info = engine_matches[path]
+        if engine_digests[enginepak][info.filename] == digests[path]:
+            report.engine_copies[path] = os.path.join('engine', os.path.basename(enginepak))
+
+    return report
+
+def index_engine_paks(engine_path):
+    """
+    Map the path of every file in the engine paks to (pak, ZipInfo), the first pak winning.
+    """
+    entries = {}
+    enginedir = os.path.join(engine_path, 'engine')
+    for pakfile in sorted(os.listdir(enginedir)):
+        if pakfile.endswith('.cryasset.pak') or not pakfile.endswith('.pak'):
+            continue
+        with zipfile.ZipFile(os.path.join(enginedir, pakfile)) as zf:
+            for info in zf.infolist():
+                if not info.filename.endswith('/'):
+                    entries.setdefault(pak_entry_name(info.filename), (os.path.join(enginedir, pakfile), info))
+    return entries
+
+def pak_entry_name(path):
+    """
+    Paths inside paks are case-insensitive and use forward slashes.
+    """
+    return path.replace('\\', '/').lower()
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_pak_entries(pakpath, infos, chunk_size=1 << 20):
+    """
+    Map the name of each of *infos* to the hash of its content, opening *pakpath* only once.
+    """
+    digests = {}
+    with zipfile.ZipFile(pakpath) as zf:
+        for info in infos:
+            digest = hashlib.sha1()
+            with zf.open(info) as fd:
+                for chunk in iter(lambda: fd.read(chunk_size), b''):
+                    digest.update(chunk)
+            digests[info.filename] = digest.hexdigest()
+    return digests
+
+def print_duplicate_report(report):
+    for size, paths in report.groups:
+        print('{} identical files of {} bytes ({} bytes wasted):'.format(len(paths), size, size * (len(paths) - 1)))
+        for path in paths:
+            print('    {}'.format(path))
+    for path, provider in report.engine_copies.items():
+        print('Also in {}: {}'.format(provider, path))
+    print('{} bytes in duplicated files, {} bytes ({} files) also in engine paks.'.format(report.wasted_bytes,
+                                                                                      report.engine_copy_bytes,
+                                                                                      len(report.engine_copies)))
+
+def get_7zip_path():
+    """
+    Path to the 7-zip executable, or None if it is not installed.
+    """
+    zip_exe = os.path.join(r"C:\Program Files\7-Zip", "7z.exe")
+    if os.path.exists(zip_exe):
+        return zip_exe
+    return None
     
-def create_config(asset_dir, export_path):
+def create_config(asset_dir, export_path, game_dll=dll_name):
     with open(os.path.join(export_path, 'system.cfg'), 'w') as fd:
         fd.write('sys_game_folder={}\n'.format(asset_dir))
-        fd.write('sys_dll_game={}\n'.format(dll_name))
+        fd.write('sys_dll_game={}\n'.format(game_dll))
 
-def copy_game_dll(project_path, export_path):
+def copy_game_dll(project_path, export_path, platform_dir=os.path.join('bin', 'win_x64')):
     """
     Search the project's bin/win_x64 directory for a game DLL.
-    When one is found, set this globally (so that it can be added to the system.cfg).
+    Returns the name of the DLL found (so that it can be added to the system.cfg), or None.
     """
-    global dll_name
+    game_dll = None
 
-    binpath = os.path.join(project_path, 'bin', 'win_x64')
+    binpath = os.path.join(project_path, platform_dir)
     for filename in os.listdir(binpath):
         # Ignore any .pdb, .ilk, .manifest, or any other files that aren't DLLs.
         if not fnmatch.fnmatch(os.path.join(binpath, filename), '*.dll'):
             continue
 
-        dll_name = filename
+        game_dll = filename
         shutil.copyfile(os.path.join(binpath, filename),
-                        os.path.join(export_path, 'bin', 'win_x64', filename))
+                        os.path.join(export_path, platform_dir, filename))
+    return game_dll
 
 def get_engine_metadata(engine_tag):
     """
@@ -527,6 +1059,234 @@ def get_windows_reg_value(Key, Name = ""):
     
     return values
 
+class DeployService(object):
+    """
+        Queue of deploy jobs, run at most *concurrency* at a time.
+        All jobs share one DeployCache, so engine lookups, engine scans and unchanged paks
+        are not repeated from one job to the next.
+    """
+
+    def __init__(self, concurrency=2, cache=None, max_jobs=100):
+        self.owns_cache = cache is None
+        self.cache = cache or DeployCache()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.lock = threading.Lock()
+        self.jobs = collections.OrderedDict()
+        self.next_id = 1
+        # Finished jobs beyond this many are forgotten, oldest first.
+        self.max_jobs = max_jobs
+
+    def submit(self, project_file, options=None):
+        if options is None:
+            options = DeployOptions()
+        if options.cache is None:
+            options.cache = self.cache
+
+        with self.lock:
+            job = DeployJob(str(self.next_id), project_file, options)
+            self.jobs[job.id] = job
+            self.next_id += 1
+            self.prune_jobs()
+        self.executor.submit(self.run_job, job)
+        return job
+
+    def prune_jobs(self):
+        """
+        Drop the oldest finished jobs while there are more than max_jobs. Must be called with the lock held.
+        """
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            if self.jobs[job_id].status in ('done', 'failed'):
+                del self.jobs[job_id]
+                excess -= 1
+
+    def run_job(self, job):
+        job.started = time.time()
+        job.status = 'running'
+        try:
+            job.result = deploy_project(job.project_file, job.options)
+            job.status = 'done'
+        except Exception as e:
+            job.error = '{}: {}'.format(type(e).__name__, e)
+            job.status = 'failed'
+        job.finished = time.time()
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+        if self.owns_cache:
+            self.cache.close()
+
+class DeployRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+        HTTP interface of the deploy service:
+        POST /jobs      queue a project, body {"project": path, plus any DeployOptions fields}
+        GET  /jobs      status of every job
+        GET  /jobs/<id> status of a single job
+        GET  /cache     cache hit/miss counters
+    """
+    # DeployOptions fields that may be set by a request, and their expected type.
+    option_fields = collections.OrderedDict([('export_path', str),
+                                             ('engine_path', str),
+                                             ('engine_version', str),
+                                             ('platform_dir', str),
+                                             ('jobs', int)])
+    # Largest request body accepted, in bytes.
+    max_body = 64 * 1024
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/jobs':
+            self.send_json(200, [job.to_dict() for job in service.list_jobs()])
+        elif self.path.startswith('/jobs/'):
+            job = service.get_job(self.path[len('/jobs/'):])
+            if job:
+                self.send_json(200, job.to_dict())
+            else:
+                self.send_json(404, {'error': 'Unknown job.'})
+        elif self.path == '/cache':
+            self.send_json(200, dict(service.cache.stats))
+        else:
+            self.send_json(404, {'error': 'Unknown path.'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self.send_json(404, {'error': 'Unknown path.'})
+            return
+
+        # Jobs can delete and overwrite directories, so only accept them from local tools, not web pages.
+        # Browsers always send an Origin header with cross-site POSTs, and cannot send JSON without one.
+        if self.headers.get('Origin') is not None:
+            self.send_json(403, {'error': 'Requests from web pages are not accepted.'})
+            return
+        if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+            self.send_json(415, {'error': 'Expected Content-Type: application/json.'})
+            return
+
+        if self.headers.get('Content-Length') is None:
+            self.send_json(411, {'error': 'Content-Length is required.'})
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except ValueError:
+            length = -1
+        if length < 0 or length > self.max_body:
+            self.send_json(400, {'error': 'Content-Length must be between 0 and {}.'.format(self.max_body)})
+            return
+
+        try:
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+            project_file = data['project']
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {'error': 'Expected a JSON object with a "project" path.'})
+            return
+
+        error = self.check_fields(data)
+        if error:
+            self.send_json(400, {'error': error})
+            return
+
+        options = DeployOptions(**{key: data[key] for key in self.option_fields if key in data})
+        job = self.server.service.submit(project_file, options)
+        self.send_json(202, job.to_dict())
+
+    def check_fields(self, data):
+        """
+        Return an error message if any field of a job request has the wrong type, otherwise None.
+        """
+        if not isinstance(data['project'], str):
+            return '"project" must be a string.'
+        for key, field_type in self.option_fields.items():
+            value = data.get(key)
+            if value is None:
+                continue
+            # bool is a subclass of int, so check the exact type.
+            if type(value) is not field_type:
+                return '"{}" must be of type {}.'.format(key, field_type.__name__)
+        if data.get('jobs') is not None and data['jobs'] < 1:
+            return '"jobs" must be at least 1.'
+        return None
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class DeployServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+        HTTP server handing requests to a DeployService
+    """
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        http.server.HTTPServer.__init__(self, address, DeployRequestHandler)
+        self.service = service
+
+class DeployClient(object):
+    """
+        Small client for a running deploy service
+    """
+
+    def __init__(self, url='http://127.0.0.1:{}'.format(daemon_port)):
+        self.url = url.rstrip('/')
+
+    def submit(self, project_file, **options):
+        """
+        Queue *project_file*; *options* may contain any of the DeployOptions fields.
+        """
+        data = dict(options, project=os.path.abspath(project_file))
+        return self.request('POST', '/jobs', data)
+
+    def status(self, job_id=None):
+        if job_id is None:
+            return self.request('GET', '/jobs')
+        return self.request('GET', '/jobs/{}'.format(job_id))
+
+    def wait(self, job_id, interval=0.5):
+        """
+        Poll until the job has finished and return its final status.
+        """
+        while True:
+            job = self.status(job_id)
+            if job['status'] in ('done', 'failed'):
+                return job
+            time.sleep(interval)
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        req = urllib.request.Request(self.url + path, data=body, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+def run_daemon(host='127.0.0.1', port=daemon_port, concurrency=2):
+    """
+    Serve deploy jobs over HTTP until interrupted.
+    """
+    service = DeployService(concurrency)
+    server = DeployServer((host, port), service)
+    print('Deploy service listening on http://{}:{}/ ({} concurrent jobs).'.format(host, server.server_port,
+                                                                                 concurrency))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
 def is_platform_valid():
     for platform_name in get_supported_platforms():
         if platform.system().lower() == platform_name.lower():
@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import shutil
+import zipfile
+import tempfile
+import time
+import threading
+import unittest
+import concurrent.futures
+import unittest.mock
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import release_ce_project as rcp
+
+
+def write_file(path, data=b'x'):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as fd:
+        fd.write(data)
+
+
+def make_engine(root, entries=None):
+    """
+    Create a minimal engine directory with one engine pak holding *entries* (name -> bytes).
+    """
+    os.makedirs(os.path.join(root, 'engine'))
+    with zipfile.ZipFile(os.path.join(root, 'engine', 'engine.pak'), 'w') as zf:
+        for name, data in (entries or {'shaders/common.cfx': b'shader'}).items():
+            zf.writestr(name, data)
+    write_file(os.path.join(root, 'bin', 'win_x64', 'CrySystem.dll'))
+    write_file(os.path.join(root, 'bin', 'win_x64', 'sub', 'a.dll'))
+    write_file(os.path.join(root, 'bin', 'win_x64', 'Sandbox.exe'))
+    return root
+
+
+def make_project(root, name, assets=None, asset_dir='Assets'):
+    """
+    Create a minimal project with the loose *assets* (relative path -> bytes) and return its .cryproject path.
+    """
+    write_file(os.path.join(root, 'bin', 'win_x64', 'MyGame.dll'))
+    for path, data in (assets or {'Objects/a.cgf': b'object'}).items():
+        write_file(os.path.join(root, asset_dir, path), data)
+    project_file = os.path.join(root, 'game.cryproject')
+    with open(project_file, 'w') as fd:
+        json.dump({'info': {'name': name},
+                   'require': {'engine': 'engine-5.3'},
+                   'content': {'assets': [asset_dir]}}, fd)
+    return project_file
+
+
+class DeployProjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.engine_path = make_engine(os.path.join(self.root, 'engine'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_concurrent_deploys_are_independent(self):
+        names = ['Game{}'.format(i) for i in range(8)]
+        project_files = {}
+        for name in names:
+            project_path = os.path.join(self.root, name)
+            project_files[name] = make_project(project_path, name, {'Objects/a.cgf': name.encode('utf-8'),
+                                                                    'Textures/b.dds': b'texture'})
+            # Every project ships its own game DLL name, so a shared dll_name would show up in system.cfg.
+            os.rename(os.path.join(project_path, 'bin', 'win_x64', 'MyGame.dll'),
+                      os.path.join(project_path, 'bin', 'win_x64', name + '.dll'))
+
+        cwd = os.getcwd()
+        env_path = os.environ.get('PATH')
+
+        # Each project is deployed three times, every deploy to its own directory.
+        runs = [(name, run) for run in range(3) for name in names]
+
+        def deploy(run):
+            options = rcp.DeployOptions(export_path=os.path.join(self.root, 'out', '{}_{}'.format(*run)),
+                                        engine_path=self.engine_path, jobs=2)
+            return rcp.deploy_project(project_files[run[0]], options)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = dict(zip(runs, executor.map(deploy, runs)))
+
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(os.environ.get('PATH'), env_path)
+        self.assertEqual(rcp.dll_name, 'Game.dll')
+        self.assertEqual(rcp.cryproject_file, '')
+
+        for (name, run), result in results.items():
+            export_path = os.path.join(self.root, 'out', '{}_{}'.format(name, run))
+            self.assertEqual(result.export_path, export_path)
+            self.assertEqual(result.dll_name, name + '.dll')
+            with open(os.path.join(export_path, 'system.cfg')) as fd:
+                self.assertEqual(fd.read(), 'sys_game_folder=Assets\nsys_dll_game={}.dll\n'.format(name))
+            with zipfile.ZipFile(os.path.join(export_path, 'Assets', 'Objects.pak')) as zf:
+                self.assertEqual(zf.read('Objects/a.cgf'), name.encode('utf-8'))
+
+            relpaths = sorted(os.path.relpath(path, export_path) for path in result.outputs)
+            self.assertEqual(relpaths, sorted([os.path.join('Assets', 'Objects.pak'),
+                                               os.path.join('Assets', 'Textures.pak'),
+                                               os.path.join('bin', 'win_x64', 'CrySystem.dll'),
+                                               os.path.join('bin', 'win_x64', 'sub', 'a.dll'),
+                                               os.path.join('bin', 'win_x64', name + '.dll'),
+                                               os.path.join('engine', 'engine.pak'),
+                                               'system.cfg']))
+            self.assertEqual(result.stats['files'], 7)
+            self.assertEqual(result.stats['paks'], 3)
+            self.assertEqual(result.stats['bytes'], sum(os.path.getsize(path) for path in result.outputs))
+            self.assertIn('assets', result.stats['steps'])
+
+
+class DeployServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.engine_path = make_engine(os.path.join(self.root, 'engine'))
+        self.project_file = make_project(os.path.join(self.root, 'project'), 'Test')
+
+        self.service = rcp.DeployService(concurrency=1)
+        self.server = rcp.DeployServer(('127.0.0.1', 0), self.service)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = rcp.DeployClient('http://127.0.0.1:{}'.format(self.server.server_port))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.shutdown()
+        shutil.rmtree(self.root)
+
+    def submit(self, name, **options):
+        options.setdefault('export_path', os.path.join(self.root, 'out', name))
+        options.setdefault('engine_path', self.engine_path)
+        return self.client.submit(self.project_file, **options)
+
+    def post(self, body, headers):
+        req = urllib.request.Request(self.client.url + '/jobs', data=body, method='POST', headers=headers)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(req)
+        context.exception.close()
+        return context.exception.code
+
+    def test_jobs_run_one_at_a_time(self):
+        job_ids = [self.submit(name)['id'] for name in ('a', 'b', 'c')]
+        jobs = [self.client.wait(job_id, interval=0.01) for job_id in job_ids]
+
+        self.assertEqual([job['status'] for job in jobs], ['done'] * 3)
+        for earlier, later in zip(jobs, jobs[1:]):
+            self.assertLessEqual(earlier['finished'], later['started'])
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'out', 'a', 'Assets', 'Objects.pak')))
+        self.assertEqual(jobs[0]['dll_name'], 'MyGame.dll')
+        self.assertIn('assets', jobs[0]['stats']['steps'])
+
+    def test_jobs_run_two_at_a_time(self):
+        self.service.shutdown()
+        self.service = self.server.service = rcp.DeployService(concurrency=2)
+
+        lock = threading.Lock()
+        running = [0]
+        overlaps = []
+        deploy_project = rcp.deploy_project
+
+        def slow_deploy(project_file, options):
+            with lock:
+                running[0] += 1
+                overlaps.append(running[0])
+            time.sleep(0.2)
+            with lock:
+                running[0] -= 1
+            return deploy_project(project_file, options)
+
+        with unittest.mock.patch.object(rcp, 'deploy_project', side_effect=slow_deploy):
+            job_ids = [self.submit(name)['id'] for name in ('a', 'b', 'c', 'd', 'e')]
+            jobs = [self.client.wait(job_id, interval=0.01) for job_id in job_ids]
+
+        self.assertEqual([job['status'] for job in jobs], ['done'] * 5)
+        self.assertEqual(max(overlaps), 2)
+        # Count the jobs already running whenever a job starts.
+        for job in jobs:
+            running_at_start = [other for other in jobs
+                                if other is not job and other['started'] <= job['started'] < other['finished']]
+            self.assertLessEqual(len(running_at_start), 1)
+
+    def test_cache_is_reused_between_jobs(self):
+        self.client.wait(self.submit('a')['id'], interval=0.01)
+        self.client.wait(self.submit('b')['id'], interval=0.01)
+
+        stats = self.client.request('GET', '/cache')
+        self.assertEqual(stats['pak_misses'], 1)
+        self.assertEqual(stats['pak_hits'], 1)
+        self.assertEqual(stats['scan_hits'], 1)
+
+    def test_failed_job_reports_error(self):
+        job = self.client.wait(self.client.submit(os.path.join(self.root, 'missing.cryproject'))['id'],
+                               interval=0.01)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('FileNotFoundError', job['error'])
+
+    def test_rejects_requests_from_web_pages(self):
+        body = json.dumps({'project': self.project_file}).encode('utf-8')
+        self.assertEqual(self.post(body, {'Content-Type': 'text/plain'}), 415)
+        self.assertEqual(self.post(body, {'Content-Type': 'application/json', 'Origin': 'http://example.com'}),
+                         403)
+        self.assertEqual(self.client.status(), [])
+
+    def test_rejects_bad_content_length(self):
+        for length in ('-1', 'abc', str(rcp.DeployRequestHandler.max_body + 1)):
+            self.assertEqual(self.post(b'{}', {'Content-Type': 'application/json', 'Content-Length': length}), 400)
+
+    def test_rejects_wrongly_typed_options(self):
+        for options in ({'jobs': '4'}, {'jobs': True}, {'jobs': 0}, {'engine_path': 1}, {'export_path': 1}):
+            body = json.dumps(dict(options, project=self.project_file)).encode('utf-8')
+            self.assertEqual(self.post(body, {'Content-Type': 'application/json'}), 400)
+
+    def test_finished_jobs_are_pruned(self):
+        self.service.max_jobs = 2
+        job_ids = [self.submit(name)['id'] for name in ('a', 'b', 'c', 'd')]
+        self.client.wait(job_ids[-1], interval=0.01)
+        self.submit('e')
+
+        self.assertEqual(len(self.client.status()), 2)
+        self.assertIsNone(self.service.get_job(job_ids[0]))
+
+
+class DeployCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = rcp.DeployCache()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.root)
+
+    def test_list_files_notices_changes_in_subdirectories(self):
+        write_file(os.path.join(self.root, 'a.dll'))
+        write_file(os.path.join(self.root, 'sub', 'b.dll'))
+        self.assertEqual(sorted(self.cache.list_files(self.root)), ['a.dll', os.path.join('sub', 'b.dll')])
+
+        os.remove(os.path.join(self.root, 'sub', 'b.dll'))
+        write_file(os.path.join(self.root, 'sub', 'deeper', 'c.dll'))
+        self.assertEqual(sorted(self.cache.list_files(self.root)),
+                         ['a.dll', os.path.join('sub', 'deeper', 'c.dll')])
+        self.assertEqual(self.cache.stats['scan_hits'], 0)
+
+        self.cache.list_files(self.root)
+        self.assertEqual(self.cache.stats['scan_hits'], 1)
+
+    def test_fetch_pak_rebuilds_when_cached_copy_is_gone(self):
+        inpath = os.path.join(self.root, 'Objects')
+        write_file(os.path.join(inpath, 'a.cgf'))
+
+        def build(pakpath):
+            write_file(pakpath, b'pak')
+
+        self.cache.fetch_pak(inpath, os.path.join(self.root, 'first.pak'), build)
+        for filename in os.listdir(self.cache.pak_dir):
+            os.remove(os.path.join(self.cache.pak_dir, filename))
+        self.cache.fetch_pak(inpath, os.path.join(self.root, 'second.pak'), build)
+
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'second.pak')))
+        self.assertEqual(self.cache.stats['pak_misses'], 2)
+
+    def test_close_removes_temporary_pak_dir(self):
+        self.cache.close()
+        self.assertFalse(os.path.exists(self.cache.pak_dir))
+
+
+class DuplicateAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.engine_path = make_engine(os.path.join(self.root, 'engine'),
+                                       {'textures/white.dds': b'white' * 20,
+                                        'textures/grey.dds': b'grey'})
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def analyse(self, assets, asset_dir='Assets'):
+        project_path = os.path.join(self.root, 'project')
+        make_project(project_path, 'Test', assets, asset_dir)
+        return rcp.analyse_duplicates(asset_dir, project_path, self.engine_path, jobs=2)
+
+    def project_file(self, *parts):
+        return os.path.join(self.root, 'project', *parts)
+
+    def test_groups_identical_files(self):
+        report = self.analyse({'Objects/a.cgf': b'same' * 10,
+                               'Objects/sub/b.cgf': b'same' * 10,
+                               'Materials/c.mtl': b'same' * 10,
+                               'Materials/d.mtl': b'diff' * 10})
+
+        self.assertEqual(report.groups, [(40, [self.project_file('Assets', 'Materials', 'c.mtl'),
+                                               self.project_file('Assets', 'Objects', 'a.cgf'),
+                                               self.project_file('Assets', 'Objects', 'sub', 'b.cgf')])])
+        self.assertEqual(report.wasted_bytes, 80)
+
+    def test_reports_copies_of_engine_files(self):
+        report = self.analyse({'Textures/White.dds': b'white' * 20,
+                               'Textures/grey.dds': b'gray',
+                               'Objects/white.dds': b'white' * 20})
+
+        self.assertEqual(dict(report.engine_copies),
+                         {self.project_file('Assets', 'Textures', 'White.dds'): os.path.join('engine', 'engine.pak')})
+        self.assertEqual(report.engine_copy_bytes, 100)
+
+    def test_only_size_matches_are_hashed(self):
+        with unittest.mock.patch.object(rcp, 'hash_file', wraps=rcp.hash_file) as hash_file, \
+                unittest.mock.patch.object(rcp, 'hash_pak_entries', wraps=rcp.hash_pak_entries) as hash_entries:
+            report = self.analyse({'Textures/grey.dds': b'not grey', 'Textures/white.dds': b'white' * 20})
+
+        hash_file.assert_called_once_with(self.project_file('Assets', 'Textures', 'white.dds'))
+        hash_entries.assert_called_once()
+        self.assertEqual(len(report.engine_copies), 1)
+
+    def test_localization_and_fastload_are_separate_mounts(self):
+        report = self.analyse({'Localization/english/t.xml': b'text', '_fastload/english/t.xml': b'text'})
+
+        self.assertEqual(report.groups, [(4, [self.project_file('Assets', 'Localization', 'english', 't.xml'),
+                                              self.project_file('Assets', '_fastload', 'english', 't.xml')])])
+
+    def test_deploy_still_packs_engine_copies(self):
+        project_file = make_project(os.path.join(self.root, 'project'), 'Test',
+                                    {'Textures/white.dds': b'white' * 20})
+        export_path = os.path.join(self.root, 'out')
+        rcp.deploy_project(project_file, rcp.DeployOptions(export_path=export_path, engine_path=self.engine_path))
+
+        with zipfile.ZipFile(os.path.join(export_path, 'Assets', 'Textures.pak')) as zf:
+            self.assertEqual(zf.namelist(), ['Textures/white.dds'])
+
+    def test_find_duplicates_reports_errors(self):
+        bad_project = os.path.join(self.root, 'bad.cryproject')
+        write_file(bad_project, b'{}')
+        project_file = make_project(os.path.join(self.root, 'project'), 'Test')
+        options = rcp.DeployOptions(engine_path=os.path.join(self.root, 'missing'))
+
+        with unittest.mock.patch('builtins.print') as print_mock:
+            self.assertIsNone(rcp.do_find_duplicates(bad_project, options))
+            self.assertIsNone(rcp.do_find_duplicates(project_file, options))
+        self.assertEqual(print_mock.call_count, 2)
+
+    def test_find_duplicates_is_not_sent_to_a_server(self):
+        project_file = make_project(os.path.join(self.root, 'project'), 'Test')
+        args = ['--server', 'http://127.0.0.1:1', '--find-duplicates', project_file]
+
+        with unittest.mock.patch.object(rcp, 'get_launch_args', return_value=args), \
+                unittest.mock.patch.object(rcp, 'DeployClient') as client, \
+                unittest.mock.patch('sys.stderr'):
+            with self.assertRaises(SystemExit):
+                rcp.main()
+        client.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()